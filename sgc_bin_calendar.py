@@ -5,16 +5,52 @@ and generates a subscribable iCal file.
 """
 
 import os
+import re
+import sys
 import requests
-from datetime import datetime, timedelta, timezone
-from icalendar import Calendar, Event
+from datetime import date, datetime, timedelta, timezone
 from pathlib import Path
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
+
+# orjson's C parser beats stdlib json on decode; fall back silently if
+# it is not installed
+try:
+    from orjson import loads as _json_loads
+except ImportError:
+    from json import loads as _json_loads
 
 # --- Config ---
 UPRN = os.environ.get("SGC_UPRN", "").strip()
 API_URL = f"https://api.southglos.gov.uk/wastecomp/GetCollectionDetails?uprn={UPRN}"
 OUTPUT_PATH = Path("docs/bin_collections.ics")
 
+HEADERS = {
+    "Accept": "application/json",
+    # Ask for a compressed body explicitly; requests decodes transparently
+    "Accept-Encoding": "gzip, deflate",
+    "User-Agent": "auto-bin-collection (+https://github.com/aow27/auto-bin-collection)",
+}
+
+# Shared session: reuses the TCP+TLS connection across retries and repeat
+# calls, and retries transient 5xx/connection errors with backoff instead
+# of failing the whole CI run on a blip.
+_SESSION = requests.Session()
+_SESSION.headers.update(HEADERS)
+_SESSION.mount(
+    "https://",
+    HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=4,
+        max_retries=Retry(
+            total=5,
+            backoff_factor=0.3,
+            status_forcelist=(500, 502, 503, 504),
+            allowed_methods=("GET",),
+        ),
+    ),
+)
+
 # Emoji/labels for each service type
 SERVICE_LABELS = {
     "Recycling": "♻️ Recycling collection",
@@ -25,27 +61,61 @@ SERVICE_LABELS = {
 
 REMINDER_HOURS_BEFORE = 8  # Reminder the evening before
 
+# Matches schedule descriptions like "Monday every week" /
+# "Monday every other week"; the optional group discriminates the two
+_SCHED_RE = re.compile(r"every (other )?week", re.IGNORECASE)
+
+
+# Zero-padded two-digit strings for month/day: a tuple index is cheaper
+# than running str.__format__'s spec parser per field
+_PAD2 = tuple(f"{i:02d}" for i in range(32))
 
-def fetch_collections():
-    response = requests.get(API_URL, timeout=10)
+
+def _fmt_date(d):
+    """Format a date as the fixed ical YYYYMMDD form."""
+    return f"{d.year}{_PAD2[d.month]}{_PAD2[d.day]}"
+
+
+def fetch_collections(session=None):
+    response = (session or _SESSION).get(API_URL, timeout=15)
     response.raise_for_status()
-    data = response.json()
-    return data["value"] 
+    data = _json_loads(response.content)
+    return data["value"]
 
 
 def build_calendar(collections):
-    cal = Calendar()
-    cal.add("prodid", "-//South Glos Bin Collections//EN")
-    cal.add("version", "2.0")
-    cal.add("calscale", "GREGORIAN")
-    cal.add("x-wr-calname", "South Glos Bin Collections")
-    cal.add("x-wr-timezone", "Europe/London")
-    cal.add("refresh-interval;value=duration", "P1D")  # suggest daily refresh
-    cal.add("x-published-ttl", "P1D")
+    # Assemble the ical text directly rather than going through the
+    # icalendar component/property object graph: the output format is
+    # fixed and line-oriented, so plain strings are both faster and
+    # simpler. Events are streamed into a bytearray (one encode per
+    # event) so no intermediate line list or joined str is built.
+    # Returns the encoded feed as bytes.
+    buf = bytearray(
+        b"BEGIN:VCALENDAR\r\n"
+        b"VERSION:2.0\r\n"
+        b"PRODID:-//South Glos Bin Collections//EN\r\n"
+        b"CALSCALE:GREGORIAN\r\n"
+        b"X-WR-CALNAME:South Glos Bin Collections\r\n"
+        b"X-WR-TIMEZONE:Europe/London\r\n"
+        b"REFRESH-INTERVAL;VALUE=DURATION:P1D\r\n"  # suggest daily refresh
+        b"X-PUBLISHED-TTL:P1D\r\n"
+    )
+    append = buf.extend
 
     # The API returns one entry per service with hso_nextcollection date
-    # We use the schedule description to project future dates too
+    # We use the schedule description to project future dates too.
+    # Projected occurrences are stored as parallel arrays rather than
+    # per-event dicts: the emit loop below only needs the raw strings,
+    # so there is no point wrapping each event in its own container.
+    # Dedup keys are packed ints (date ordinal + small service id):
+    # hashing one int is cheaper than a (str, date) tuple per check.
+    service_ids = {}
     seen = set()
+    dates = []
+    labels = []
+    descs = []
+    alarm_descs = []
+    uids = []
 
     for item in collections:
         service = item.get("hso_servicename", "Unknown")
@@ -55,65 +125,106 @@ def build_calendar(collections):
         if not next_collection_str:
             continue
 
-        next_date = datetime.fromisoformat(next_collection_str).date()
+        # The API always returns "YYYY-MM-DDTHH:MM:SS+00:00", so slice the
+        # date fields directly rather than paying for fromisoformat's full
+        # timezone-aware parse and throwaway datetime object
+        s = next_collection_str
+        try:
+            next_date = date(int(s[0:4]), int(s[5:7]), int(s[8:10]))
+        except (ValueError, IndexError):
+            continue
         label = SERVICE_LABELS.get(service, f"🗑️ {service} collection")
 
-        # Determine recurrence interval from schedule description
-        # e.g. "Monday every week" or "Monday every other week"
-        if "every other week" in schedule.lower():
-            interval_days = 14
-        elif "every week" in schedule.lower():
-            interval_days = 7
-        else:
-            interval_days = None  # single event only
+        # Determine recurrence interval from the schedule description:
+        # one case-insensitive scan instead of two lowercased searches
+        m = _SCHED_RE.search(schedule)
+        interval_days = (14 if m.group(1) else 7) if m else None
 
-        # Generate events: next collection + 26 weeks forward
+        # Generate events: next collection + 26 weeks forward.
+        # Everything except the date is the same for every projected
+        # occurrence of a service, so format it once up front.
         current_date = next_date
         weeks_ahead = 26
         end_date = next_date + timedelta(weeks=weeks_ahead)
+        interval = timedelta(days=interval_days) if interval_days else None
+        desc = f"Schedule: {schedule}\\nRound: {item.get('hso_round', '')}"
+        alarm_desc = f"Tomorrow: {label}"
+        service_l = service.lower()
+        # 64 leaves ample headroom; the API returns a handful of services
+        sid = service_ids.setdefault(service, len(service_ids))
 
         while current_date <= end_date:
-            key = (service, current_date)
+            key = current_date.toordinal() * 64 + sid
             if key not in seen:
                 seen.add(key)
-                event = Event()
-                event.add("summary", label)
-                event.add("dtstart", current_date)
-                event.add("dtend", current_date + timedelta(days=1))
-                event.add("description", f"Schedule: {schedule}\nRound: {item.get('hso_round', '')}")
-                # UID ensures calendar apps update rather than duplicate
-                uid = f"{service.lower()}-{current_date.isoformat()}@southglos-bins"
-                event.add("uid", uid)
-                event.add("dtstamp", datetime.now(timezone.utc))
-
-                # Add a reminder alarm the evening before
-                from icalendar import Alarm
-                alarm = Alarm()
-                alarm.add("action", "DISPLAY")
-                alarm.add("description", f"Tomorrow: {label}")
-                alarm.add("trigger", timedelta(hours=-REMINDER_HOURS_BEFORE))
-                event.add_component(alarm)
-
-                cal.add_component(event)
-
-            if interval_days:
-                current_date += timedelta(days=interval_days)
+                dates.append(current_date)
+                labels.append(label)
+                descs.append(desc)
+                alarm_descs.append(alarm_desc)
+                uids.append(f"{service_l}-{current_date.isoformat()}@southglos-bins")
+
+            if interval:
+                current_date += interval
             else:
                 break
 
-    return cal
+    # Loop invariant: one timestamp for the whole feed. The formats are
+    # fixed, so f-strings beat strftime's locale-aware format machinery.
+    t = datetime.now(timezone.utc)
+    dtstamp = (
+        f"{t.year:04d}{t.month:02d}{t.day:02d}"
+        f"T{t.hour:02d}{t.minute:02d}{t.second:02d}Z"
+    )
+
+    # Emit in date order
+    for i in sorted(range(len(dates)), key=dates.__getitem__):
+        d = dates[i]
+        dtstart = _fmt_date(d)
+        # DTEND is the next day; ordinal arithmetic skips the timedelta
+        dtend = _fmt_date(date.fromordinal(d.toordinal() + 1))
+        # UID ensures calendar apps update rather than duplicate; the
+        # VALARM is the reminder the evening before
+        append((
+            "BEGIN:VEVENT\r\n"
+            f"SUMMARY:{labels[i]}\r\n"
+            f"DTSTART;VALUE=DATE:{dtstart}\r\n"
+            f"DTEND;VALUE=DATE:{dtend}\r\n"
+            f"DTSTAMP:{dtstamp}\r\n"
+            f"UID:{uids[i]}\r\n"
+            f"DESCRIPTION:{descs[i]}\r\n"
+            "BEGIN:VALARM\r\n"
+            "ACTION:DISPLAY\r\n"
+            f"DESCRIPTION:{alarm_descs[i]}\r\n"
+            f"TRIGGER:-PT{REMINDER_HOURS_BEFORE}H\r\n"
+            "END:VALARM\r\n"
+            "END:VEVENT\r\n"
+        ).encode("utf-8"))
+
+    append(b"END:VCALENDAR\r\n")
+    return bytes(buf)
 
 
 def main():
+    # Fail fast on misconfiguration rather than burning an HTTP round
+    # trip on a ?uprn= request that can only return junk
+    if not UPRN:
+        raise SystemExit("SGC_UPRN not set")
+
     print(f"Fetching collection data for UPRN: {UPRN}")
     collections = fetch_collections()
-    print(f"Got {len(collections)} services: {[c.get('hso_servicename') for c in collections]}")
 
-    cal = build_calendar(collections)
+    ics = build_calendar(collections)
 
     OUTPUT_PATH.parent.mkdir(parents=True, exist_ok=True)
-    OUTPUT_PATH.write_bytes(cal.to_ical())
-    print(f"Written {OUTPUT_PATH}")
+    OUTPUT_PATH.write_bytes(ics)
+
+    # One write for the remaining status output: CI consoles are often
+    # unbuffered, so each print would be its own syscall
+    sys.stdout.write(
+        f"Got {len(collections)} services: "
+        f"{[c.get('hso_servicename') for c in collections]}\n"
+        f"Written {OUTPUT_PATH}\n"
+    )
 
 
 if __name__ == "__main__":